@@ -5,10 +5,13 @@ import os
 import json
 import glob
 import socket
+import time
 import uuid
 from datetime import datetime
 from flask import Flask, jsonify, render_template, request
 from flask_cors import CORS
+from indexes import TestCaseIndex, SORT_FIELDS, normalize_datetime
+from results import ResultsStore, RESULT_STATUSES, parse_result
 
 app = Flask(__name__)
 CORS(app)
@@ -16,6 +19,39 @@ CORS(app)
 # Путь к директории с тест-кейсами
 TEST_CASES_DIR = os.path.join(os.path.dirname(__file__), 'test_cases')
 
+# Путь к директории с результатами прогонов (по файлу на день)
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'test_results')
+
+# Сколько ошибок разбора результатов возвращать в ответе на загрузку
+MAX_REPORTED_ERRORS = 100
+
+# Параметры пагинации для сортированных запросов
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Параметры диапазонных фильтров: поле -> (нижняя граница, верхняя граница)
+RANGE_QUERY_PARAMS = {
+    'created_at': ('created_after', 'created_before'),
+    'updated_at': ('updated_after', 'updated_before'),
+}
+
+# Фильтры по агрегатам результатов прогонов
+RESULTS_FILTER_PARAMS = ('last_status', 'min_pass_rate', 'max_pass_rate', 'min_flakiness')
+
+# Параметры запроса, включающие сортированную выдачу с пагинацией
+LISTING_QUERY_PARAMS = ('sort', 'order', 'cursor', 'limit') + tuple(
+    param for params in RANGE_QUERY_PARAMS.values() for param in params
+) + RESULTS_FILTER_PARAMS
+
+# Как часто (в секундах) сортированные запросы сверяют индекс с файлами на диске
+INDEX_CHECK_INTERVAL = 2.0
+
+# Отсортированные индексы тест-кейсов (строятся при первом запросе)
+test_case_index = TestCaseIndex()
+
+# Результаты прогонов и агрегаты по тест-кейсам (загружаются при первом запросе)
+results_store = ResultsStore(RESULTS_DIR)
+
 def load_test_cases_recursive(directory):
     """
     Рекурсивно загружает все JSON файлы из директории и её поддиректорий
@@ -74,6 +110,158 @@ def load_test_cases_recursive(directory):
     
     return test_cases, file_structure
 
+def get_file_mtimes(directory):
+    """
+    Возвращает время изменения всех JSON файлов дерева: {относительный путь: st_mtime_ns}.
+    Требует только stat файлов, без чтения и разбора JSON
+    """
+    file_mtimes = {}
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith('.json'):
+                file_path = os.path.join(root, filename)
+                file_mtimes[os.path.relpath(file_path, directory)] = os.stat(file_path).st_mtime_ns
+    return file_mtimes
+
+def get_test_case_index():
+    """
+    Возвращает индекс тест-кейсов, при необходимости строя его с диска.
+    Если файлы изменились в обход API (git pull, ручная правка, repack.py),
+    индекс сбрасывается и строится заново. Сверка стоит O(число файлов) вызовов stat,
+    поэтому выполняется не чаще раза в INDEX_CHECK_INTERVAL секунд
+    """
+    now = time.monotonic()
+    if (test_case_index.is_built and test_case_index.checked_at is not None
+            and now - test_case_index.checked_at < INDEX_CHECK_INTERVAL):
+        return test_case_index
+
+    file_mtimes = get_file_mtimes(TEST_CASES_DIR)
+    if test_case_index.is_stale(file_mtimes):
+        test_case_index.invalidate()
+    if not test_case_index.is_built:
+        test_cases, _ = load_test_cases_recursive(TEST_CASES_DIR)
+        test_case_index.build(test_cases, file_mtimes)
+    test_case_index.checked_at = now
+    return test_case_index
+
+def get_index_file_states(file_paths):
+    """Возвращает пары (относительный путь, st_mtime_ns или None) для JSON файлов из file_paths"""
+    states = []
+    for file_path in file_paths:
+        full_file_path = os.path.join(TEST_CASES_DIR, file_path)
+        rel_path = os.path.relpath(full_file_path, TEST_CASES_DIR)
+        if rel_path.endswith('.json'):
+            mtime = os.stat(full_file_path).st_mtime_ns if os.path.exists(full_file_path) else None
+            states.append((rel_path, mtime))
+    return states
+
+def check_index_before_write(*file_paths):
+    """Сбрасывает индекс, если файлы, которые API собирается записать, менялись в обход API"""
+    for rel_path, mtime in get_index_file_states(file_paths):
+        test_case_index.check_file(rel_path, mtime)
+
+def record_index_writes(*file_paths):
+    """Запоминает в индексе время изменения файлов, записанных или удаленных через API"""
+    for rel_path, mtime in get_index_file_states(file_paths):
+        test_case_index.touch_file(rel_path, mtime)
+
+def is_listing_query(args):
+    """Проверяет, запрошена ли сортированная выдача с пагинацией"""
+    return any(param in args for param in LISTING_QUERY_PARAMS)
+
+def parse_listing_params(args):
+    """
+    Разбирает параметры sort, order, cursor, limit и created_after/created_before/
+    updated_after/updated_before. Выбрасывает ValueError при некорректных значениях
+    """
+    ranges = {}
+    for field, params in RANGE_QUERY_PARAMS.items():
+        bounds = []
+        for param in params:
+            value = args.get(param)
+            if value:
+                # Границы сравниваются со строковыми ключами индекса, поэтому приводим их к тому же виду
+                try:
+                    value = normalize_datetime(value)
+                except ValueError:
+                    raise ValueError(f'Параметр "{param}" должен быть датой в формате ISO 8601')
+            bounds.append(value or None)
+        if any(bounds):
+            ranges[field] = tuple(bounds)
+
+    # По умолчанию сортируем по полю диапазонного фильтра, чтобы он ограничивался бинарным поиском
+    sort = args.get('sort') or next(iter(ranges), 'updated_at')
+    if sort not in SORT_FIELDS:
+        raise ValueError(f'Сортировка возможна по полям: {", ".join(SORT_FIELDS)}')
+
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('Параметр "order" должен быть "asc" или "desc"')
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Параметр "limit" должен быть числом')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'Параметр "limit" должен быть от 1 до {MAX_PAGE_SIZE}')
+
+    return {
+        'sort': sort,
+        'order': order,
+        'ranges': ranges,
+        'cursor': args.get('cursor') or None,
+        'limit': limit
+    }
+
+def parse_results_filters(args):
+    """
+    Разбирает фильтры по агрегатам результатов (last_status, min_pass_rate,
+    max_pass_rate, min_flakiness) и возвращает функцию-предикат для тест-кейса
+    или None, если фильтры не заданы. Выбрасывает ValueError при некорректных значениях
+    """
+    last_status = args.get('last_status')
+    if last_status is not None and last_status not in RESULT_STATUSES:
+        raise ValueError(f'Параметр "last_status" должен быть одним из: {", ".join(RESULT_STATUSES)}')
+
+    bounds = {}
+    for param in ('min_pass_rate', 'max_pass_rate', 'min_flakiness'):
+        if args.get(param) is None:
+            continue
+        try:
+            value = float(args[param])
+        except ValueError:
+            value = None
+        # float() принимает nan и inf, поэтому проверяем диапазон явно
+        if value is None or not 0 <= value <= 1:
+            raise ValueError(f'Параметр "{param}" должен быть числом от 0 до 1')
+        bounds[param] = value
+
+    if last_status is None and not bounds:
+        return None
+
+    def predicate(test_case):
+        aggregate = results_store.get_aggregate(test_case['id'])
+        if aggregate is None:
+            return False
+        if last_status is not None and aggregate['last_status'] != last_status:
+            return False
+        pass_rate = aggregate['pass_rate']
+        if 'min_pass_rate' in bounds and (pass_rate is None or pass_rate < bounds['min_pass_rate']):
+            return False
+        if 'max_pass_rate' in bounds and (pass_rate is None or pass_rate > bounds['max_pass_rate']):
+            return False
+        if 'min_flakiness' in bounds and aggregate['flakiness'] < bounds['min_flakiness']:
+            return False
+        return True
+
+    return predicate
+
+def matches_search_query(test_case, query):
+    """Проверяет совпадение тест-кейса с поисковым запросом по id, title и тегам"""
+    return (query in test_case.get('id', '').lower() or 
+            query in test_case.get('title', '').lower() or
+            any(query in tag.lower() for tag in test_case.get('tags', [])))
+
 @app.route('/')
 def index():
     """Главная страница"""
@@ -82,6 +270,9 @@ def index():
 @app.route('/api/test-cases')
 def get_test_cases():
     """API для получения всех тест-кейсов"""
+    if is_listing_query(request.args):
+        return list_test_cases_sorted()
+
     try:
         test_cases, file_structure = load_test_cases_recursive(TEST_CASES_DIR)
         return jsonify({
@@ -95,6 +286,55 @@ def get_test_cases():
             'error': str(e)
         }), 500
 
+def list_test_cases_sorted(query=None):
+    """
+    Сортированная выдача тест-кейсов по индексу с keyset-пагинацией.
+    Если задан query, тест-кейсы дополнительно фильтруются по поисковому запросу
+    """
+    try:
+        params = parse_listing_params(request.args)
+        results_predicate = parse_results_filters(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    predicates = []
+    if results_predicate is not None:
+        predicates.append(results_predicate)
+    if query:
+        predicates.append(lambda test_case: matches_search_query(test_case, query))
+    predicate = None
+    if predicates:
+        predicate = lambda test_case: all(p(test_case) for p in predicates)
+
+    try:
+        page, next_cursor = get_test_case_index().query(predicate=predicate, **params)
+        # Добавляем агрегаты результатов прогонов к каждому тест-кейсу страницы
+        test_cases = [
+            dict(item, results=results_store.get_aggregate(item['test_case']['id']))
+            for item in page
+        ]
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+    # Поиск возвращает найденное в поле results, список - в поле test_cases
+    result_key = 'results' if query else 'test_cases'
+    return jsonify({
+        'success': True,
+        result_key: test_cases,
+        'next_cursor': next_cursor
+    })
+
 @app.route('/api/test-cases/search')
 def search_test_cases():
     """API для поиска тест-кейсов"""
@@ -102,16 +342,16 @@ def search_test_cases():
     if not query:
         return jsonify({'success': True, 'results': []})
     
+    if is_listing_query(request.args):
+        return list_test_cases_sorted(query)
+
     try:
         test_cases, _ = load_test_cases_recursive(TEST_CASES_DIR)
         results = []
         
         for item in test_cases:
-            test_case = item['test_case']
             # Поиск по id, title и тегам
-            if (query in test_case.get('id', '').lower() or 
-                query in test_case.get('title', '').lower() or
-                any(query in tag.lower() for tag in test_case.get('tags', []))):
+            if matches_search_query(item['test_case'], query):
                 results.append(item)
         
         return jsonify({
@@ -134,7 +374,8 @@ def get_test_case_by_id(test_case_id):
             if item['test_case']['id'] == test_case_id:
                 return jsonify({
                     'success': True,
-                    'test_case': item
+                    'test_case': item,
+                    'results': results_store.get_aggregate(test_case_id)
                 })
         
         return jsonify({
@@ -198,6 +439,8 @@ def create_test_case():
         else:
             file_data = []
         
+        check_index_before_write(file_path)
+        
         # Добавляем новый тест-кейс
         if isinstance(file_data, list):
             file_data.append(data)
@@ -208,6 +451,9 @@ def create_test_case():
         with open(full_file_path, 'w', encoding='utf-8') as f:
             json.dump(file_data, f, ensure_ascii=False, indent=2)
         
+        test_case_index.upsert(file_path, data)
+        record_index_writes(file_path)
+        
         return jsonify({
             'success': True,
             'test_case': data,
@@ -252,6 +498,8 @@ def update_test_case(test_case_id):
         with open(full_file_path, 'r', encoding='utf-8') as f:
             file_data = json.load(f)
         
+        check_index_before_write(file_path)
+        
         # Обновляем тест-кейс в файле
         if isinstance(file_data, list):
             for i, tc in enumerate(file_data):
@@ -266,6 +514,12 @@ def update_test_case(test_case_id):
         with open(full_file_path, 'w', encoding='utf-8') as f:
             json.dump(file_data, f, ensure_ascii=False, indent=2)
         
+        # Если в теле запроса изменен ID, убираем из индекса запись со старым ID
+        if updated_test_case.get('id') != test_case_id:
+            test_case_index.remove(test_case_id)
+        test_case_index.upsert(file_path, updated_test_case)
+        record_index_writes(file_path)
+        
         return jsonify({
             'success': True,
             'test_case': updated_test_case
@@ -302,12 +556,16 @@ def delete_test_case(test_case_id):
         with open(full_file_path, 'r', encoding='utf-8') as f:
             file_data = json.load(f)
         
+        check_index_before_write(file_path)
+        
         # Удаляем тест-кейс из файла
         if isinstance(file_data, list):
             file_data = [tc for tc in file_data if tc.get('id') != test_case_id]
             if len(file_data) == 0:
                 # Если файл пустой, удаляем его
                 os.remove(full_file_path)
+                test_case_index.remove(test_case_id)
+                record_index_writes(file_path)
                 return jsonify({
                     'success': True,
                     'message': 'Тест-кейс удален, файл удален (был пустой)'
@@ -315,6 +573,8 @@ def delete_test_case(test_case_id):
         else:
             # Если в файле был только один тест-кейс, удаляем файл
             os.remove(full_file_path)
+            test_case_index.remove(test_case_id)
+            record_index_writes(file_path)
             return jsonify({
                 'success': True,
                 'message': 'Тест-кейс удален, файл удален'
@@ -324,6 +584,9 @@ def delete_test_case(test_case_id):
         with open(full_file_path, 'w', encoding='utf-8') as f:
             json.dump(file_data, f, ensure_ascii=False, indent=2)
         
+        test_case_index.remove(test_case_id)
+        record_index_writes(file_path)
+        
         return jsonify({
             'success': True,
             'message': 'Тест-кейс удален'
@@ -367,6 +630,8 @@ def duplicate_test_case(test_case_id):
         with open(full_file_path, 'r', encoding='utf-8') as f:
             file_data = json.load(f)
         
+        check_index_before_write(file_path)
+        
         if isinstance(file_data, list):
             file_data.append(duplicated_test_case)
         else:
@@ -375,6 +640,9 @@ def duplicate_test_case(test_case_id):
         with open(full_file_path, 'w', encoding='utf-8') as f:
             json.dump(file_data, f, ensure_ascii=False, indent=2)
         
+        test_case_index.upsert(file_path, duplicated_test_case)
+        record_index_writes(file_path)
+        
         return jsonify({
             'success': True,
             'test_case': duplicated_test_case
@@ -456,6 +724,8 @@ def move_test_case(test_case_id):
         with open(old_full_path, 'r', encoding='utf-8') as f:
             old_file_data = json.load(f)
         
+        check_index_before_write(old_file_path, new_file_path)
+        
         # Удаляем тест-кейс из старого файла
         if isinstance(old_file_data, list):
             old_file_data = [tc for tc in old_file_data if tc.get('id') != test_case_id]
@@ -493,6 +763,9 @@ def move_test_case(test_case_id):
         with open(new_full_path, 'w', encoding='utf-8') as f:
             json.dump(new_file_data, f, ensure_ascii=False, indent=2)
         
+        test_case_index.upsert(new_file_path, test_case_item['test_case'])
+        record_index_writes(old_file_path, new_file_path)
+        
         return jsonify({
             'success': True,
             'message': f'Тест-кейс перемещен в {new_file_path}',
@@ -544,6 +817,8 @@ def reorder_test_case_steps(test_case_id):
         with open(full_file_path, 'r', encoding='utf-8') as f:
             file_data = json.load(f)
         
+        check_index_before_write(file_path)
+        
         # Обновляем тест-кейс в файле
         if isinstance(file_data, list):
             for i, tc in enumerate(file_data):
@@ -558,6 +833,9 @@ def reorder_test_case_steps(test_case_id):
         with open(full_file_path, 'w', encoding='utf-8') as f:
             json.dump(file_data, f, ensure_ascii=False, indent=2)
         
+        test_case_index.upsert(file_path, updated_test_case)
+        record_index_writes(file_path)
+        
         return jsonify({
             'success': True,
             'test_case': updated_test_case
@@ -569,6 +847,46 @@ def reorder_test_case_steps(test_case_id):
             'error': str(e)
         }), 500
 
+@app.route('/api/results', methods=['POST'])
+def ingest_results():
+    """API для пакетной загрузки результатов прогонов в формате NDJSON"""
+    try:
+        body = request.get_data(as_text=True)
+        records = []
+        errors = []
+        
+        # Каждая непустая строка - отдельный результат
+        for line_number, line in enumerate(body.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(parse_result(json.loads(line)))
+            except ValueError as e:
+                # json.JSONDecodeError - подкласс ValueError
+                errors.append({'line': line_number, 'error': str(e)})
+        
+        if not records:
+            return jsonify({
+                'success': False,
+                'error': 'Нет корректных результатов для загрузки',
+                'errors': errors[:MAX_REPORTED_ERRORS]
+            }), 400
+        
+        results_store.ingest(records)
+        
+        return jsonify({
+            'success': True,
+            'accepted': len(records),
+            'rejected': len(errors),
+            'errors': errors[:MAX_REPORTED_ERRORS]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 def find_free_port(start_port=5001, max_port=5010):
     """Находит свободный порт начиная с start_port"""
     for port in range(start_port, max_port + 1):
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Отсортированные вторичные индексы тест-кейсов для сортировки,
+диапазонных запросов по времени и keyset-пагинации
+"""
+
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+
+def _text_key(value):
+    """Ключ для строковых полей: пустые значения сортируются первыми"""
+    return value if isinstance(value, str) else ''
+
+
+def normalize_datetime(value):
+    """
+    Приводит дату ISO 8601 к виду YYYY-MM-DDTHH:MM:SS.ffffff, в котором строки
+    сортируются как время. Время со смещением переводится в UTC, время без смещения
+    (как в created_at/updated_at, которые пишет API) остается как есть.
+    Выбрасывает ValueError при некорректной дате
+    """
+    # fromisoformat до Python 3.11 не понимает суффикс Z
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        try:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        except OverflowError:
+            raise ValueError('Дата выходит за допустимый диапазон')
+    return parsed.isoformat(timespec='microseconds')
+
+
+def _datetime_key(value):
+    """Ключ для дат: нормализованная строка, пустые и некорректные значения сортируются первыми"""
+    if not isinstance(value, str):
+        return ''
+    try:
+        return normalize_datetime(value)
+    except ValueError:
+        return ''
+
+
+def _title_key(value):
+    """Ключ для названия: сортировка без учета регистра"""
+    return _text_key(value).casefold()
+
+
+# Поля, по которым поддерживаются индексы, и функции построения ключей
+SORT_FIELDS = {
+    'created_at': _datetime_key,
+    'updated_at': _datetime_key,
+    'title': _title_key,
+    'status': _text_key,
+}
+
+
+class SortedIndex:
+    """
+    Индекс по одному полю: отсортированный массив пар (ключ, id).
+    Вставка и удаление выполняются через bisect, поиск границ диапазона - O(log n)
+    """
+
+    def __init__(self, key_func):
+        self.key_func = key_func
+        self._entries = []  # отсортированные пары (ключ, id)
+        self._keys = []     # ключи в том же порядке, для поиска границ диапазона
+        self._by_id = {}    # id -> текущий ключ
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, test_case_id, value):
+        """Добавляет (или перемещает) запись тест-кейса в индексе"""
+        self.remove(test_case_id)
+        key = self.key_func(value)
+        entry = (key, test_case_id)
+        position = bisect_left(self._entries, entry)
+        self._entries.insert(position, entry)
+        self._keys.insert(position, key)
+        self._by_id[test_case_id] = key
+
+    def remove(self, test_case_id):
+        """Удаляет запись тест-кейса из индекса, если она есть"""
+        key = self._by_id.pop(test_case_id, None)
+        if key is None:
+            return
+        position = bisect_left(self._entries, (key, test_case_id))
+        del self._entries[position]
+        del self._keys[position]
+
+    def scan(self, low=None, high=None, after=None, reverse=False):
+        """
+        Итерирует пары (ключ, id) с low < ключ < high в порядке индекса.
+        after - позиция курсора (ключ, id), записи до нее включительно пропускаются
+        """
+        start = bisect_right(self._keys, low) if low is not None else 0
+        end = bisect_left(self._keys, high) if high is not None else len(self._keys)
+
+        if after is not None:
+            if reverse:
+                end = min(end, bisect_left(self._entries, after))
+            else:
+                start = max(start, bisect_right(self._entries, after))
+
+        positions = range(end - 1, start - 1, -1) if reverse else range(start, end)
+        for position in positions:
+            yield self._entries[position]
+
+
+def encode_cursor(sort, order, key, test_case_id):
+    """Кодирует позицию в индексе в непрозрачную строку курсора"""
+    raw = json.dumps([sort, order, key, test_case_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, sort, order):
+    """Декодирует курсор; ValueError, если курсор поврежден или от другой сортировки или порядка"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        cursor_sort, cursor_order, key, test_case_id = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Некорректный курсор')
+    if (cursor_sort != sort or cursor_order != order
+            or not isinstance(key, str) or not isinstance(test_case_id, str)):
+        raise ValueError('Курсор не соответствует параметрам сортировки')
+    return key, test_case_id
+
+
+class TestCaseIndex:
+    """
+    Хранит тест-кейсы в памяти вместе с отсортированными индексами по SORT_FIELDS.
+    Строится из загруженных с диска данных и далее обновляется на месте при каждом
+    изменении через API. Чтобы заметить изменения в обход API, индекс помнит время
+    изменения каждого файла, из которого построен
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items = None  # id -> {'file_path': ..., 'test_case': ...}
+        self._file_mtimes = {}  # относительный путь файла -> st_mtime_ns
+        self.checked_at = None  # time.monotonic() последней сверки с диском
+        self._indexes = {field: SortedIndex(key_func) for field, key_func in SORT_FIELDS.items()}
+
+    @property
+    def is_built(self):
+        return self._items is not None
+
+    def build(self, test_cases, file_mtimes=None):
+        """
+        Перестраивает индексы по списку элементов из load_test_cases_recursive.
+        file_mtimes - время изменения файлов на момент загрузки
+        """
+        with self._lock:
+            self._items = {}
+            self._file_mtimes = dict(file_mtimes or {})
+            self._indexes = {field: SortedIndex(key_func) for field, key_func in SORT_FIELDS.items()}
+            for item in test_cases:
+                self._put(item['file_path'], item['test_case'])
+
+    def invalidate(self):
+        """Сбрасывает индексы; они будут построены заново при следующем запросе"""
+        with self._lock:
+            self._items = None
+
+    def is_stale(self, file_mtimes):
+        """Проверяет, изменились ли файлы с момента построения индекса"""
+        with self._lock:
+            return self._items is not None and file_mtimes != self._file_mtimes
+
+    def check_file(self, file_path, mtime):
+        """
+        Перед записью через API сверяет время изменения файла (None - файла нет)
+        с запомненным. Если файл менялся в обход API, индекс сбрасывается: иначе
+        последующий touch_file скрыл бы это изменение
+        """
+        with self._lock:
+            if self._items is not None and self._file_mtimes.get(file_path) != mtime:
+                self._items = None
+
+    def touch_file(self, file_path, mtime):
+        """Запоминает новое время изменения файла, записанного через API (None - файл удален)"""
+        with self._lock:
+            if self._items is None:
+                return
+            if mtime is None:
+                self._file_mtimes.pop(file_path, None)
+            else:
+                self._file_mtimes[file_path] = mtime
+
+    def upsert(self, file_path, test_case):
+        """Добавляет или обновляет тест-кейс во всех индексах"""
+        with self._lock:
+            if self._items is not None:
+                self._put(file_path, test_case)
+
+    def remove(self, test_case_id):
+        """Удаляет тест-кейс из всех индексов"""
+        with self._lock:
+            if self._items is None:
+                return
+            self._items.pop(test_case_id, None)
+            for index in self._indexes.values():
+                index.remove(test_case_id)
+
+    def _put(self, file_path, test_case):
+        test_case_id = test_case['id']
+        self._items[test_case_id] = {
+            'file_path': file_path,
+            'test_case': test_case
+        }
+        for field, index in self._indexes.items():
+            index.add(test_case_id, test_case.get(field))
+
+    def query(self, sort, order='asc', ranges=None, cursor=None, limit=50, predicate=None):
+        """
+        Возвращает страницу тест-кейсов, отсортированных по полю sort, и курсор
+        следующей страницы (None, если страница последняя).
+
+        ranges - словарь {поле: (после, до)} с исключающими границами. Диапазон по полю
+        сортировки ограничивается бинарным поиском, по остальным полям - фильтром при обходе.
+        Тест-кейсы без значения поля под диапазонный фильтр не попадают
+        """
+        # Границы приводятся к виду ключей индекса (см. normalize_datetime)
+        ranges = {
+            field: tuple(normalize_datetime(bound) if bound else None for bound in bounds)
+            for field, bounds in (ranges or {}).items()
+        }
+        after = decode_cursor(cursor, sort, order) if cursor else None
+
+        with self._lock:
+            index = self._indexes[sort]
+            low, high = ranges.get(sort, (None, None))
+            if sort in ranges and low is None:
+                low = ''
+
+            page = []
+            next_cursor = None
+            for key, test_case_id in index.scan(low, high, after, reverse=(order == 'desc')):
+                item = self._items[test_case_id]
+                if not self._matches_ranges(item['test_case'], ranges, sort):
+                    continue
+                if predicate is not None and not predicate(item['test_case']):
+                    continue
+                if len(page) == limit:
+                    last = page[-1]['test_case']
+                    next_cursor = encode_cursor(sort, order, index.key_func(last.get(sort)), last['id'])
+                    break
+                page.append(item)
+
+            return page, next_cursor
+
+    @staticmethod
+    def _matches_ranges(test_case, ranges, sort):
+        for field, (low, high) in ranges.items():
+            if field == sort:
+                continue
+            key = SORT_FIELDS[field](test_case.get(field))
+            if not key:
+                return False
+            if low is not None and key <= low:
+                return False
+            if high is not None and key >= high:
+                return False
+        return True
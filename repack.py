@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Офлайн-перепаковка дерева тест-кейсов: разбивает слишком большие JSON файлы
+и объединяет мелкие внутри каждой папки до целевого размера, сохраняя ID
+тест-кейсов и принадлежность к папкам. Запускайте при остановленном приложении
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from app import TEST_CASES_DIR, load_test_cases_recursive
+
+# Целевой размер файла по умолчанию
+DEFAULT_TARGET_SIZE = '256K'
+
+# Файл больше target * OVERSIZE_FACTOR считается слишком большим
+OVERSIZE_FACTOR = 1.5
+
+# Файл меньше target * UNDERSIZE_FACTOR считается слишком мелким
+UNDERSIZE_FACTOR = 0.25
+
+SIZE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# Префикс временных файлов и имя журнала незавершенной замены в папке
+TEMP_PREFIX = '.repack-'
+JOURNAL_NAME = '.repack-journal'
+
+
+def parse_size(value):
+    """Разбирает размер вида 512, 256K, 1M"""
+    value = value.strip().upper().rstrip('B')
+    multiplier = 1
+    if value and value[-1] in SIZE_UNITS:
+        multiplier = SIZE_UNITS[value[-1]]
+        value = value[:-1]
+    try:
+        size = int(float(value) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Некорректный размер: {value}')
+    if size <= 0:
+        raise argparse.ArgumentTypeError('Размер должен быть положительным')
+    return size
+
+
+def format_size(size):
+    """Человекочитаемый размер"""
+    for unit in ('', 'K', 'M'):
+        if size < 1024:
+            return f'{size:.0f}{unit}B' if not unit else f'{size:.1f}{unit}B'
+        size /= 1024
+    return f'{size:.1f}GB'
+
+
+def serialize(data, minify):
+    """Сериализует содержимое файла тест-кейсов в нормализованном формате"""
+    if minify:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def measure_tree(directory):
+    """
+    Снимает метрики дерева: число файлов, объем, время полного сканирования
+    (как при каждом запросе к API) и время перезаписи самого большого файла
+    (как при каждом изменении тест-кейса в нем)
+    """
+    started = time.perf_counter()
+    test_cases, _ = load_test_cases_recursive(directory)
+    scan_seconds = time.perf_counter() - started
+
+    file_sizes = {}
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith('.json'):
+                path = os.path.join(root, filename)
+                file_sizes[path] = os.path.getsize(path)
+
+    largest_path = max(file_sizes, key=file_sizes.get) if file_sizes else None
+    write_seconds = 0.0
+    if largest_path:
+        # Повторяем путь записи API: чтение файла и сохранение с indent=2
+        started = time.perf_counter()
+        with open(largest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with tempfile.TemporaryFile('w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        write_seconds = time.perf_counter() - started
+
+    return {
+        'files': len(file_sizes),
+        'bytes': sum(file_sizes.values()),
+        'largest_bytes': file_sizes[largest_path] if largest_path else 0,
+        'scan_seconds': scan_seconds,
+        'write_seconds': write_seconds,
+        'membership': Counter(
+            (os.path.dirname(item['file_path']), item['test_case']['id']) for item in test_cases
+        )
+    }
+
+
+def plan_shards(cases, filenames, target_size, minify):
+    """
+    Жадно раскладывает тест-кейсы (в исходном порядке) по файлам размером до target_size.
+    Файлы называются по первому попавшему в них исходному файлу, повторы получают суффикс _N
+    """
+    shards = []
+    current = None
+    for source_name, case in cases:
+        case_size = len(serialize(case, minify).encode('utf-8'))
+        if current is None or (current['cases'] and current['size'] + case_size > target_size):
+            current = {'source': source_name, 'cases': [], 'size': 0}
+            shards.append(current)
+        current['cases'].append(case)
+        current['size'] += case_size
+
+    used_names = set()
+    for shard in shards:
+        stem = shard['source'][:-len('.json')]
+        name = shard['source']
+        suffix = 2
+        while name in used_names:
+            name = f'{stem}_{suffix}.json'
+            suffix += 1
+        used_names.add(name)
+        shard['name'] = name
+
+    # Исходные файлы, имена которых не достались новым, удаляются после замены
+    stale = [name for name in filenames if name not in used_names]
+    return shards, stale
+
+
+def write_atomic_staged(path, content, mode_source):
+    """
+    Пишет содержимое во временный файл рядом с path (с правами доступа mode_source)
+    и возвращает его путь
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    shutil.copymode(mode_source, temp_path)
+    return temp_path
+
+
+def fsync_directory(folder):
+    """Сбрасывает на диск записи каталога (переименования и удаления), где это поддерживается"""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def recover_folder(folder):
+    """
+    Доводит до конца замену, прерванную на прошлом запуске: по журналу переименовывает
+    оставшиеся временные файлы и удаляет лишние исходные. Без журнала просто удаляет
+    временные файлы, которые не успели попасть в журнал. Возвращает True, если замена была доведена
+    """
+    journal_path = os.path.join(folder, JOURNAL_NAME)
+    if not os.path.exists(journal_path):
+        for name in os.listdir(folder):
+            if name.startswith(TEMP_PREFIX) and name.endswith('.tmp'):
+                os.remove(os.path.join(folder, name))
+        return False
+
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        journal = json.load(f)
+    for temp_name, name in journal['replace']:
+        temp_path = os.path.join(folder, temp_name)
+        if os.path.exists(temp_path):
+            os.replace(temp_path, os.path.join(folder, name))
+    for name in journal['remove']:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+    fsync_directory(folder)
+    os.remove(journal_path)
+    fsync_directory(folder)
+    return True
+
+
+def count_case_ids(files):
+    """Считает ID тест-кейсов в содержимом файлов так же, как load_test_cases_recursive"""
+    ids = Counter()
+    for data in files:
+        for case in (data if isinstance(data, list) else [data]):
+            if isinstance(case, dict) and 'id' in case:
+                ids[case['id']] += 1
+    return ids
+
+
+def repack_folder(task):
+    """
+    Перепаковывает одну папку (выполняется в отдельном процессе).
+    Все новые файлы сначала пишутся во временные, затем в папку записывается журнал
+    с планом замены, после чего временные файлы подменяют исходные через os.replace
+    и удаляются лишние исходные файлы. Если процесс прервется после записи журнала,
+    следующий запуск доведет замену до конца (см. recover_folder)
+    """
+    folder, target_size, minify, normalize, dry_run = task
+    if os.path.exists(os.path.join(folder, JOURNAL_NAME)):
+        if dry_run:
+            return {'folder': folder, 'action': 'skipped',
+                    'error': 'есть незавершенная перепаковка, запустите без --dry-run'}
+        recover_folder(folder)
+        recovered = True
+    else:
+        recovered = False if dry_run else recover_folder(folder)
+
+    filenames = sorted(name for name in os.listdir(folder)
+                       if name.endswith('.json') and os.path.isfile(os.path.join(folder, name)))
+
+    contents = {}
+    for filename in filenames:
+        path = os.path.join(folder, filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            contents[filename] = (json.loads(text), len(text.encode('utf-8')), text)
+        except (json.JSONDecodeError, IOError, UnicodeDecodeError) as e:
+            # Не трогаем папку с поврежденными файлами, чтобы не потерять данные
+            return {'folder': folder, 'action': 'skipped', 'error': f'{filename}: {e}'}
+
+    oversized = [name for name, (_, size, _) in contents.items() if size > target_size * OVERSIZE_FACTOR]
+    undersized = [name for name, (_, size, _) in contents.items() if size < target_size * UNDERSIZE_FACTOR]
+    needs_repack = bool(oversized) or len(undersized) > 1
+
+    if needs_repack:
+        cases = []
+        for filename in filenames:
+            data = contents[filename][0]
+            for case in (data if isinstance(data, list) else [data]):
+                cases.append((filename, case))
+        shards, stale = plan_shards(cases, filenames, target_size, minify)
+        outputs = {shard['name']: shard['cases'] for shard in shards}
+        sources = {shard['name']: shard['source'] for shard in shards}
+        action = 'repacked'
+    elif normalize:
+        outputs = {filename: data for filename, (data, _, text) in contents.items()
+                   if text != serialize(data, minify)}
+        sources = {filename: filename for filename in outputs}
+        stale = []
+        action = 'normalized' if outputs else 'unchanged'
+    else:
+        outputs, sources, stale, action = {}, {}, [], 'unchanged'
+
+    # Проверяем план до записи: набор ID в папке должен остаться прежним
+    planned = {name: contents[name][0] for name in filenames if name not in stale}
+    planned.update(outputs)
+    source_ids = count_case_ids(data for data, _, _ in contents.values())
+    if count_case_ids(planned.values()) != source_ids:
+        return {'folder': folder, 'action': 'skipped',
+                'error': 'план перепаковки меняет набор тест-кейсов, папка не изменена'}
+
+    result = {
+        'folder': folder,
+        'action': action,
+        'recovered': recovered,
+        'files_before': len(filenames),
+        'files_after': len(filenames) - len(stale) + len(set(outputs) - set(filenames)),
+        'oversized': oversized,
+        'undersized': undersized if len(undersized) > 1 else []
+    }
+    if dry_run or not outputs:
+        return result
+
+    staged = []
+    try:
+        for name, data in outputs.items():
+            path = os.path.join(folder, name)
+            temp_path = write_atomic_staged(path, serialize(data, minify), os.path.join(folder, sources[name]))
+            staged.append((os.path.basename(temp_path), name))
+        journal = json.dumps({'replace': staged, 'remove': stale}, ensure_ascii=False)
+        journal_temp_path = write_atomic_staged(os.path.join(folder, JOURNAL_NAME), journal,
+                                                os.path.join(folder, filenames[0]))
+    except Exception:
+        for temp_name, _ in staged:
+            os.remove(os.path.join(folder, temp_name))
+        raise
+
+    # С этого момента замену можно довести до конца по журналу
+    os.replace(journal_temp_path, os.path.join(folder, JOURNAL_NAME))
+    fsync_directory(folder)
+    recover_folder(folder)
+    return result
+
+
+def repack_folder_safe(task):
+    """
+    Вызывает repack_folder и превращает ошибку в пропуск папки, чтобы сбой
+    в одной папке не прерывал отчет по остальным
+    """
+    try:
+        return repack_folder(task)
+    except Exception as e:
+        return {'folder': task[0], 'action': 'skipped', 'error': f'{type(e).__name__}: {e}'}
+
+
+def print_metrics(title, metrics):
+    print(f"{title}: {metrics['files']} файлов, {format_size(metrics['bytes'])}, "
+          f"самый большой {format_size(metrics['largest_bytes'])}")
+    print(f"   ⏱️  сканирование дерева: {metrics['scan_seconds'] * 1000:.1f} мс, "
+          f"перезапись самого большого файла: {metrics['write_seconds'] * 1000:.1f} мс")
+
+
+def main(argv=None):
+    """Основная функция"""
+    parser = argparse.ArgumentParser(
+        description='Перепаковка JSON файлов тест-кейсов до целевого размера в каждой папке')
+    parser.add_argument('--dir', default=TEST_CASES_DIR,
+                        help='директория с тест-кейсами (по умолчанию test_cases)')
+    parser.add_argument('--target-size', type=parse_size, default=parse_size(DEFAULT_TARGET_SIZE),
+                        help=f'целевой размер файла, например 128K или 1M (по умолчанию {DEFAULT_TARGET_SIZE})')
+    parser.add_argument('--minify', action='store_true',
+                        help='записывать файлы без отступов (API при изменении снова сохраняет с отступами)')
+    parser.add_argument('--normalize', action='store_true',
+                        help='переформатировать и файлы в папках, которые не требуют перепаковки')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='число параллельных процессов (по умолчанию число ядер)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='только показать план, ничего не изменяя')
+    args = parser.parse_args(argv)
+
+    directory = os.path.abspath(args.dir)
+    if not os.path.isdir(directory):
+        print(f"❌ Директория {directory} не найдена")
+        sys.exit(1)
+
+    print(f"📦 Перепаковка {directory} (целевой размер {format_size(args.target_size)})")
+    print("-" * 50)
+
+    # Сначала доводим прерванные замены, иначе снимок "до" увидит полузамененное дерево
+    # с дублями и пропусками. При пробном запуске такие папки пропускаются в repack_folder
+    if not args.dry_run:
+        for root, _, filenames in os.walk(directory):
+            if JOURNAL_NAME in filenames and recover_folder(root):
+                print(f"🔁 {os.path.relpath(root, directory)}: доведена прерванная перепаковка")
+
+    before = measure_tree(directory)
+    print_metrics("📊 До", before)
+
+    folders = sorted({root for root, _, filenames in os.walk(directory)
+                      if any(name.endswith('.json') for name in filenames)})
+    tasks = [(folder, args.target_size, args.minify, args.normalize, args.dry_run) for folder in folders]
+
+    if args.jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(repack_folder_safe, tasks))
+    else:
+        results = [repack_folder_safe(task) for task in tasks]
+
+    for result in results:
+        folder = os.path.relpath(result['folder'], directory)
+        if result.get('recovered'):
+            print(f"🔁 {folder}: доведена прерванная перепаковка")
+        if result['action'] == 'skipped':
+            print(f"⚠️  {folder}: пропущена ({result['error']})")
+        elif result['action'] != 'unchanged':
+            print(f"{'📝' if args.dry_run else '✅'} {folder}: {result['action']}, "
+                  f"файлов {result['files_before']} → {result['files_after']}")
+            if result['oversized']:
+                print(f"   слишком больших файлов: {len(result['oversized'])} "
+                      f"({', '.join(result['oversized'][:5])}{', ...' if len(result['oversized']) > 5 else ''})")
+            if result['undersized']:
+                print(f"   слишком мелких файлов: {len(result['undersized'])}")
+
+    if args.dry_run:
+        print("💡 Пробный запуск: файлы не изменены")
+        return
+
+    after = measure_tree(directory)
+    print("-" * 50)
+    print_metrics("📊 После", after)
+
+    if after['membership'] != before['membership']:
+        print("❌ Набор тест-кейсов по папкам изменился после перепаковки")
+        sys.exit(1)
+    print("✅ ID тест-кейсов и их папки сохранены")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Хранилище результатов прогонов тест-кейсов и агрегаты по каждому тест-кейсу
+"""
+
+import os
+import json
+import glob
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+
+# Допустимые статусы результатов
+RESULT_STATUSES = ('passed', 'failed', 'error', 'skipped')
+
+# Статусы, которые учитываются в проценте успешных прогонов и нестабильности
+COUNTED_STATUSES = ('passed', 'failed', 'error')
+
+# Сколько последних по времени прогонов учитывается в нестабильности и перцентилях длительности
+AGGREGATE_WINDOW = 100
+
+# Перцентили длительности в агрегатах
+DURATION_PERCENTILES = (50, 90, 95)
+
+# Разделители для компактной записи строк партиций
+COMPACT_SEPARATORS = (',', ':')
+
+
+def parse_result(raw):
+    """
+    Проверяет один результат из NDJSON и приводит его к компактной записи хранилища:
+    {"id": id тест-кейса, "s": статус, "d": длительность в секундах или null,
+     "t": время прогона ISO 8601 в UTC, "r": id пайплайна или null}.
+    Время без смещения считается UTC, отсутствующее - текущим временем в UTC
+    Выбрасывает ValueError при некорректных данных
+    """
+    if not isinstance(raw, dict):
+        raise ValueError('Результат должен быть JSON-объектом')
+
+    test_case_id = raw.get('test_case_id')
+    if not isinstance(test_case_id, str) or not test_case_id:
+        raise ValueError('Поле "test_case_id" обязательно')
+
+    status = raw.get('status')
+    status = status.lower() if isinstance(status, str) else status
+    if status not in RESULT_STATUSES:
+        raise ValueError(f'Поле "status" должно быть одним из: {", ".join(RESULT_STATUSES)}')
+
+    duration = raw.get('duration')
+    if duration is not None:
+        # json.loads пропускает NaN и Infinity, их тоже отклоняем
+        if (isinstance(duration, bool) or not isinstance(duration, (int, float))
+                or not math.isfinite(duration) or duration < 0):
+            raise ValueError('Поле "duration" должно быть неотрицательным числом секунд')
+
+    timestamp = raw.get('timestamp')
+    if timestamp is None:
+        run_at = datetime.now(timezone.utc)
+    elif not isinstance(timestamp, str):
+        raise ValueError('Поле "timestamp" должно быть датой в формате ISO 8601')
+    else:
+        try:
+            # fromisoformat до Python 3.11 не понимает суффикс Z
+            if timestamp.endswith('Z'):
+                timestamp = timestamp[:-1] + '+00:00'
+            run_at = datetime.fromisoformat(timestamp)
+        except ValueError:
+            raise ValueError('Поле "timestamp" должно быть датой в формате ISO 8601')
+        if run_at.tzinfo is None:
+            run_at = run_at.replace(tzinfo=timezone.utc)
+        else:
+            try:
+                run_at = run_at.astimezone(timezone.utc)
+            except OverflowError:
+                # Например, 9999-12-31T23:00:00-05:00 выходит за пределы datetime в UTC
+                raise ValueError('Поле "timestamp" выходит за допустимый диапазон дат')
+    # Единый формат в UTC: строки сравниваются как время, первые 10 символов - дата партиции
+    timestamp = run_at.isoformat(timespec='microseconds')
+
+    run_id = raw.get('run_id')
+    if run_id is not None and not isinstance(run_id, str):
+        run_id = str(run_id)
+
+    return {'id': test_case_id, 's': status, 'd': duration, 't': timestamp, 'r': run_id}
+
+
+class CaseResultsAggregate:
+    """
+    Агрегаты результатов одного тест-кейса, обновляемые инкрементально:
+    последний статус, процент успешных прогонов, нестабильность и перцентили длительности.
+    Окна последних прогонов упорядочены по времени прогона, а не по порядку поступления,
+    поэтому агрегаты не зависят от порядка загрузки и совпадают после перезапуска
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.counts = dict.fromkeys(RESULT_STATUSES, 0)
+        self.last_status = None
+        self.last_run_at = None
+        self.last_run_id = None
+        # Пары (время, статус) последних прогонов по времени и число смен статуса между соседними
+        self._recent_statuses = []
+        self._flips = 0
+        # Пары (время, длительность) последних прогонов по времени и те же длительности по возрастанию
+        self._recent_durations = []
+        self._sorted_durations = []
+
+    def add(self, record):
+        """Учитывает один результат в компактной записи хранилища"""
+        status = record['s']
+        self.total += 1
+        self.counts[status] += 1
+
+        # При совпадении времени последний прогон выбирается по статусу и run_id,
+        # чтобы результат не зависел от порядка поступления
+        last_key = (record['t'], status, record['r'] or '')
+        if self.last_run_at is None or last_key > (self.last_run_at, self.last_status, self.last_run_id or ''):
+            self.last_status = status
+            self.last_run_at = record['t']
+            self.last_run_id = record['r']
+
+        if status in COUNTED_STATUSES:
+            self._add_status(record['t'], status)
+
+        duration = record['d']
+        if duration is not None:
+            entry = (record['t'], duration)
+            insort(self._recent_durations, entry)
+            insort(self._sorted_durations, duration)
+            if len(self._recent_durations) > AGGREGATE_WINDOW:
+                _, oldest = self._recent_durations.pop(0)
+                del self._sorted_durations[bisect_left(self._sorted_durations, oldest)]
+
+    def _add_status(self, timestamp, status):
+        """Вставляет статус в окно по времени, пересчитывая смены статуса только у соседей"""
+        window = self._recent_statuses
+        entry = (timestamp, status)
+        position = bisect_right(window, entry)
+        before = window[position - 1][1] if position > 0 else None
+        after = window[position][1] if position < len(window) else None
+        if before is not None and after is not None and before != after:
+            self._flips -= 1
+        if before is not None and before != status:
+            self._flips += 1
+        if after is not None and after != status:
+            self._flips += 1
+        window.insert(position, entry)
+
+        if len(window) > AGGREGATE_WINDOW:
+            _, oldest = window.pop(0)
+            if oldest != window[0][1]:
+                self._flips -= 1
+
+    @property
+    def pass_rate(self):
+        """Доля успешных прогонов среди passed/failed/error, None если таких прогонов нет"""
+        counted = sum(self.counts[status] for status in COUNTED_STATUSES)
+        if not counted:
+            return None
+        return self.counts['passed'] / counted
+
+    @property
+    def flakiness(self):
+        """Доля смен статуса между соседними прогонами в окне AGGREGATE_WINDOW"""
+        if len(self._recent_statuses) < 2:
+            return 0.0
+        return self._flips / (len(self._recent_statuses) - 1)
+
+    def duration_percentile(self, percentile):
+        """Перцентиль длительности (nearest-rank) по окну AGGREGATE_WINDOW"""
+        if not self._sorted_durations:
+            return None
+        rank = max(1, -(-percentile * len(self._sorted_durations) // 100))
+        return self._sorted_durations[rank - 1]
+
+    def to_dict(self):
+        pass_rate = self.pass_rate
+        return {
+            'total': self.total,
+            'counts': dict(self.counts),
+            'last_status': self.last_status,
+            'last_run_at': self.last_run_at,
+            'last_run_id': self.last_run_id,
+            'pass_rate': round(pass_rate, 4) if pass_rate is not None else None,
+            'flakiness': round(self.flakiness, 4),
+            'duration_percentiles': {
+                f'p{percentile}': self.duration_percentile(percentile)
+                for percentile in DURATION_PERCENTILES
+            }
+        }
+
+
+class ResultsStore:
+    """
+    Append-only хранилище результатов: по одному NDJSON-файлу на день прогона
+    по UTC (YYYY-MM-DD.ndjson). Агрегаты держатся в памяти, при первом обращении
+    восстанавливаются чтением всех партиций и далее обновляются при каждой загрузке
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._aggregates = None  # id тест-кейса -> CaseResultsAggregate
+
+    def _ensure_loaded(self):
+        if self._aggregates is not None:
+            return
+        aggregates = {}
+        partitions = sorted(glob.glob(os.path.join(self.directory, '*.ndjson')))
+        for partition_path in partitions:
+            with open(partition_path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        aggregate = aggregates.get(record['id'])
+                        if aggregate is None:
+                            aggregate = aggregates[record['id']] = CaseResultsAggregate()
+                        aggregate.add(record)
+                    except (json.JSONDecodeError, KeyError, TypeError) as e:
+                        print(f"Ошибка при чтении результата {partition_path}:{line_number}: {e}")
+        self._aggregates = aggregates
+
+    def ingest(self, records):
+        """
+        Дописывает проверенные записи (см. parse_result) в дневные партиции
+        и обновляет агрегаты. Каждая партиция дописывается одной операцией записи
+        """
+        by_day = {}
+        for record in records:
+            by_day.setdefault(record['t'][:10], []).append(record)
+
+        with self._lock:
+            self._ensure_loaded()
+            os.makedirs(self.directory, exist_ok=True)
+            for day, day_records in by_day.items():
+                lines = ''.join(
+                    json.dumps(record, ensure_ascii=False, separators=COMPACT_SEPARATORS) + '\n'
+                    for record in day_records
+                )
+                with open(os.path.join(self.directory, f'{day}.ndjson'), 'a', encoding='utf-8') as f:
+                    f.write(lines)
+
+            for record in records:
+                aggregate = self._aggregates.get(record['id'])
+                if aggregate is None:
+                    aggregate = self._aggregates[record['id']] = CaseResultsAggregate()
+                aggregate.add(record)
+
+    def get_aggregate(self, test_case_id):
+        """Возвращает агрегаты тест-кейса в виде словаря или None, если результатов нет"""
+        with self._lock:
+            self._ensure_loaded()
+            aggregate = self._aggregates.get(test_case_id)
+            return aggregate.to_dict() if aggregate is not None else None
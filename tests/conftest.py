@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import app as app_module
+from indexes import TestCaseIndex
+from results import ResultsStore
+
+
+@pytest.fixture
+def test_cases_dir(tmp_path):
+    """Копия test_cases из репозитория во временной директории"""
+    directory = tmp_path / 'test_cases'
+    shutil.copytree(os.path.join(ROOT_DIR, 'test_cases'), directory)
+    return directory
+
+
+@pytest.fixture
+def client(test_cases_dir, tmp_path, monkeypatch):
+    """Тестовый клиент Flask поверх временной копии данных и пустых индексов"""
+    monkeypatch.setattr(app_module, 'TEST_CASES_DIR', str(test_cases_dir))
+    monkeypatch.setattr(app_module, 'INDEX_CHECK_INTERVAL', 0)
+    monkeypatch.setattr(app_module, 'test_case_index', TestCaseIndex())
+    monkeypatch.setattr(app_module, 'results_store', ResultsStore(str(tmp_path / 'test_results')))
+    return app_module.app.test_client()
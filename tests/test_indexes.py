@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+import app as app_module
+import indexes
+from indexes import SortedIndex, decode_cursor, encode_cursor
+
+
+def make_index(count=25):
+    index = indexes.TestCaseIndex()
+    index.build([
+        {
+            'file_path': 'cases.json',
+            'test_case': {
+                'id': f'tc_{i:03}',
+                'title': f'Case {i % 7}',
+                'status': 'Draft' if i % 2 else 'Ready',
+                'created_at': f'2025-01-{i % 10 + 1:02}T00:00:00',
+                'updated_at': f'2025-02-{i + 1:02}T00:00:00',
+            }
+        }
+        for i in range(count)
+    ])
+    return index
+
+
+def collect_pages(index, **params):
+    ids, cursor = [], None
+    while True:
+        page, cursor = index.query(cursor=cursor, **params)
+        ids.extend(item['test_case']['id'] for item in page)
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize('sort', ['created_at', 'updated_at', 'title', 'status'])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_cursor_pages_cover_full_order_with_duplicate_keys(sort, order):
+    index = make_index()
+    full, cursor = index.query(sort, order=order, limit=100)
+    assert cursor is None
+
+    paged = collect_pages(index, sort=sort, order=order, limit=4)
+
+    assert paged == [item['test_case']['id'] for item in full]
+    assert len(set(paged)) == 25
+
+
+def test_range_bounds_are_exclusive_and_skip_missing_values():
+    index = make_index(5)
+    index.upsert('cases.json', {'id': 'no_dates', 'title': 'x'})
+
+    page, _ = index.query('updated_at', ranges={'updated_at': ('2025-02-02T00:00:00', '2025-02-05T00:00:00')})
+    assert [item['test_case']['id'] for item in page] == ['tc_002', 'tc_003']
+
+    page, _ = index.query('title', ranges={'created_at': (None, '2025-01-03T00:00:00')})
+    assert 'no_dates' not in [item['test_case']['id'] for item in page]
+
+
+def test_upsert_and_remove_update_index_in_place():
+    index = make_index(3)
+    index.upsert('cases.json', {'id': 'tc_001', 'title': 'AAA'})
+    index.remove('tc_002')
+
+    page, _ = index.query('title')
+    assert [item['test_case']['id'] for item in page] == ['tc_001', 'tc_000']
+
+
+def test_cursor_from_other_sort_or_order_is_rejected():
+    cursor = encode_cursor('title', 'asc', 'a', 'tc_1')
+    assert decode_cursor(cursor, 'title', 'asc') == ('a', 'tc_1')
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 'status', 'asc')
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 'title', 'desc')
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor', 'title', 'asc')
+
+
+def test_sorted_index_scan_after_cursor_descending():
+    index = SortedIndex(lambda value: value)
+    for i, key in enumerate(['b', 'a', 'b', 'c']):
+        index.add(f'id{i}', key)
+
+    assert list(index.scan(after=('b', 'id2'), reverse=True)) == [('b', 'id0'), ('a', 'id1')]
+
+
+def test_api_sorted_listing_pages(client):
+    response = client.get('/api/test-cases?sort=title&limit=2')
+    assert response.status_code == 200
+    first = response.json
+    second = client.get(f'/api/test-cases?sort=title&limit=2&cursor={first["next_cursor"]}').json
+
+    titles = [item['test_case']['title'] for item in first['test_cases'] + second['test_cases']]
+    assert titles == sorted(titles, key=str.casefold)
+    assert second['next_cursor'] is None
+
+
+def test_api_rejects_cursor_with_other_order(client):
+    cursor = client.get('/api/test-cases?sort=title&limit=1').json['next_cursor']
+
+    assert client.get(f'/api/test-cases?sort=title&order=desc&cursor={cursor}').status_code == 400
+
+
+def test_api_checks_files_at_most_once_per_interval(client, monkeypatch):
+    calls = []
+    get_file_mtimes = app_module.get_file_mtimes
+
+    def counting_get_file_mtimes(directory):
+        calls.append(directory)
+        return get_file_mtimes(directory)
+
+    monkeypatch.setattr(app_module, 'get_file_mtimes', counting_get_file_mtimes)
+    monkeypatch.setattr(app_module, 'INDEX_CHECK_INTERVAL', 60)
+
+    for _ in range(3):
+        client.get('/api/test-cases?sort=title')
+
+    assert len(calls) == 1
+
+
+def test_api_plain_listing_is_unchanged(client):
+    data = client.get('/api/test-cases').json
+    assert 'file_structure' in data and 'next_cursor' not in data
+
+
+@pytest.mark.parametrize('query', ['sort=bad', 'order=up', 'limit=0', 'cursor=zzz', 'created_after=yesterday'])
+def test_api_rejects_bad_listing_params(client, query):
+    assert client.get(f'/api/test-cases?{query}').status_code == 400
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('updated_after=2025-09-24 09:35:00', ['tc_003']),
+    ('updated_after=2025-09-24T12:35:00%2B03:00', ['tc_003']),
+    ('updated_after=2025-09-24T09:35:00Z', ['tc_003']),
+    ('updated_before=2025-09-24T09:30:15.954731', []),
+    ('updated_after=2025-09-24', ['tc_001', 'tc_003']),
+])
+def test_api_range_bounds_are_normalized(client, query, expected):
+    items = client.get(f'/api/test-cases?{query}').json['test_cases']
+    assert [item['test_case']['id'] for item in items] == expected
+
+
+def test_api_sorted_listing_sees_changes_outside_api(client, test_cases_dir):
+    assert len(client.get('/api/test-cases?sort=title').json['test_cases']) == 3
+
+    (test_cases_dir / '789.json').unlink()
+
+    assert len(client.get('/api/test-cases?sort=title').json['test_cases']) == 2
+    assert len(client.get('/api/test-cases').json['test_cases']) == 2
+
+
+def test_api_write_does_not_hide_earlier_change_to_same_file(client, test_cases_dir):
+    client.get('/api/test-cases?sort=title')
+    path = test_cases_dir / 'playwright' / '123.json'
+    data = json.loads(path.read_text(encoding='utf-8'))
+    path.write_text(json.dumps([data, {'id': 'ext_1', 'title': 'External'}]), encoding='utf-8')
+
+    client.put('/api/test-case/tc_001', json={'title': 'Edited'})
+
+    ids = [item['test_case']['id'] for item in client.get('/api/test-cases?sort=title').json['test_cases']]
+    assert 'ext_1' in ids
+
+
+def test_api_update_with_new_id_leaves_no_ghost(client):
+    client.get('/api/test-cases?sort=title')
+
+    client.put('/api/test-case/tc_001', json={'id': 'tc_new'})
+
+    ids = [item['test_case']['id'] for item in client.get('/api/test-cases?sort=title').json['test_cases']]
+    assert sorted(ids) == ['tc_002', 'tc_003', 'tc_new']
+
+
+def test_api_mutations_update_index_without_rebuild(client):
+    client.get('/api/test-cases?sort=title')
+    client.post('/api/test-case', json={'title': 'AAA', 'author': 'qa', 'id': 'tc_first'})
+    client.put('/api/test-case/tc_002/move', json={'file_path': 'moved/cases.json'})
+
+    items = client.get('/api/test-cases?sort=title').json['test_cases']
+
+    file_paths = {item['test_case']['id']: item['file_path'] for item in items}
+    assert items[0]['test_case']['id'] == 'tc_first'
+    assert file_paths['tc_002'] == 'moved/cases.json'
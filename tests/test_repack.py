@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+from collections import Counter
+
+import pytest
+
+import repack
+from app import load_test_cases_recursive
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def membership(directory):
+    test_cases, _ = load_test_cases_recursive(str(directory))
+    return Counter((os.path.dirname(item['file_path']), item['test_case']['id']) for item in test_cases)
+
+
+def big_case(case_id):
+    return {'id': case_id, 'title': 'x' * 400}
+
+
+def run_folder(folder, target_size=1024, minify=False, normalize=False, dry_run=False):
+    return repack.repack_folder((str(folder), target_size, minify, normalize, dry_run))
+
+
+def test_plan_shards_avoids_name_collisions():
+    cases = [('a.json', big_case(f'a{i}')) for i in range(3)] + [('a_2.json', big_case('b'))]
+
+    shards, stale = repack.plan_shards(cases, ['a.json', 'a_2.json'], target_size=600, minify=False)
+
+    names = [shard['name'] for shard in shards]
+    assert names == ['a.json', 'a_2.json', 'a_3.json', 'a_2_2.json']
+    assert stale == []
+
+
+def test_split_with_existing_suffix_file_keeps_every_case(tmp_path):
+    folder = tmp_path / 'cases'
+    folder.mkdir()
+    write_json(folder / 'a.json', [big_case(f'a{i}') for i in range(6)])
+    write_json(folder / 'a_2.json', [big_case('b')])
+    before = membership(tmp_path)
+
+    result = run_folder(folder)
+
+    assert result['action'] == 'repacked'
+    assert membership(tmp_path) == before
+    assert all(path.stat().st_size <= 1024 * repack.OVERSIZE_FACTOR for path in folder.glob('*.json'))
+
+
+def test_merges_small_files_within_folder_only(tmp_path):
+    for folder_name in ('one', 'two'):
+        folder = tmp_path / folder_name
+        folder.mkdir()
+        for i in range(5):
+            write_json(folder / f'{i}.json', {'id': f'{folder_name}_{i}'})
+    before = membership(tmp_path)
+
+    for folder_name in ('one', 'two'):
+        run_folder(tmp_path / folder_name, target_size=64 * 1024, minify=True)
+
+    assert membership(tmp_path) == before
+    assert [path.name for path in (tmp_path / 'one').iterdir()] == ['0.json']
+
+
+def test_dry_run_changes_nothing(tmp_path):
+    for i in range(3):
+        write_json(tmp_path / f'{i}.json', {'id': f'c{i}'})
+
+    result = run_folder(tmp_path, target_size=64 * 1024, dry_run=True)
+
+    assert result['files_after'] == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['0.json', '1.json', '2.json']
+
+
+def test_interrupted_swap_is_finished_on_next_run(tmp_path, monkeypatch):
+    for i in range(4):
+        write_json(tmp_path / f'{i}.json', {'id': f'c{i}'})
+    before = membership(tmp_path)
+    recover_folder = repack.recover_folder
+
+    def crash_after_first_replace(folder):
+        journal_path = tmp_path / repack.JOURNAL_NAME
+        if not journal_path.exists():
+            return recover_folder(folder)
+        temp_name, name = json.loads(journal_path.read_text(encoding='utf-8'))['replace'][0]
+        (tmp_path / temp_name).replace(tmp_path / name)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(repack, 'recover_folder', crash_after_first_replace)
+    with pytest.raises(KeyboardInterrupt):
+        run_folder(tmp_path, target_size=64 * 1024)
+    assert membership(tmp_path) != before
+
+    monkeypatch.setattr(repack, 'recover_folder', recover_folder)
+    result = run_folder(tmp_path, target_size=64 * 1024)
+
+    assert result['recovered']
+    assert membership(tmp_path) == before
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['0.json']
+
+
+def test_orphaned_temp_files_are_removed(tmp_path):
+    write_json(tmp_path / 'a.json', {'id': 'a'})
+    (tmp_path / '.repack-orphan.tmp').write_text('[]', encoding='utf-8')
+
+    run_folder(tmp_path)
+
+    assert [path.name for path in tmp_path.iterdir()] == ['a.json']
+
+
+def test_folder_is_skipped_when_plan_changes_case_ids(tmp_path, monkeypatch):
+    for i in range(3):
+        write_json(tmp_path / f'{i}.json', {'id': f'c{i}'})
+    plan_shards = repack.plan_shards
+
+    def lossy_plan(*args):
+        shards, stale = plan_shards(*args)
+        shards[0]['cases'].pop()
+        return shards, stale
+
+    monkeypatch.setattr(repack, 'plan_shards', lossy_plan)
+
+    result = run_folder(tmp_path, target_size=64 * 1024)
+
+    assert result['action'] == 'skipped'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['0.json', '1.json', '2.json']
+
+
+def test_folder_with_invalid_json_is_skipped(tmp_path):
+    (tmp_path / 'bad.json').write_text('{oops', encoding='utf-8')
+    write_json(tmp_path / 'a.json', {'id': 'a'})
+    write_json(tmp_path / 'b.json', {'id': 'b'})
+
+    assert run_folder(tmp_path, target_size=64 * 1024)['action'] == 'skipped'
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+@pytest.mark.parametrize('value, expected', [('512', 512), ('256K', 256 * 1024), ('1mb', 1024 ** 2)])
+def test_parse_size(value, expected):
+    assert repack.parse_size(value) == expected
+
+
+def test_main_finishes_interrupted_swap_before_measuring(tmp_path, monkeypatch, capsys):
+    folder = tmp_path / 'cases'
+    folder.mkdir()
+    for i in range(4):
+        write_json(folder / f'{i}.json', {'id': f'c{i}'})
+    before = membership(tmp_path)
+    recover_folder = repack.recover_folder
+
+    def crash_after_first_replace(path):
+        journal_path = folder / repack.JOURNAL_NAME
+        if not journal_path.exists():
+            return recover_folder(path)
+        temp_name, name = json.loads(journal_path.read_text(encoding='utf-8'))['replace'][0]
+        (folder / temp_name).replace(folder / name)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(repack, 'recover_folder', crash_after_first_replace)
+    with pytest.raises(KeyboardInterrupt):
+        run_folder(folder, target_size=64 * 1024)
+    monkeypatch.setattr(repack, 'recover_folder', recover_folder)
+
+    repack.main(['--dir', str(tmp_path), '--jobs', '1', '--target-size', '64K'])
+
+    output = capsys.readouterr().out
+    assert 'доведена прерванная перепаковка' in output
+    assert 'ID тест-кейсов и их папки сохранены' in output
+    assert membership(tmp_path) == before
+
+
+def test_main_reports_every_folder_when_one_fails(tmp_path, monkeypatch, capsys):
+    for folder_name in ('broken', 'good'):
+        folder = tmp_path / folder_name
+        folder.mkdir()
+        for i in range(3):
+            write_json(folder / f'{i}.json', {'id': f'{folder_name}_{i}'})
+    write_atomic_staged = repack.write_atomic_staged
+
+    def failing_write(path, content, mode_source):
+        if os.sep + 'broken' + os.sep in path:
+            raise OSError('disk full')
+        return write_atomic_staged(path, content, mode_source)
+
+    monkeypatch.setattr(repack, 'write_atomic_staged', failing_write)
+
+    repack.main(['--dir', str(tmp_path), '--jobs', '1', '--target-size', '64K'])
+
+    output = capsys.readouterr().out
+    assert 'broken: пропущена (OSError: disk full)' in output
+    assert 'good: repacked' in output
+    assert 'После' in output
+    assert len(list((tmp_path / 'broken').iterdir())) == 3
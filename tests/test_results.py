@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import json
+import random
+
+import pytest
+
+import results
+from results import CaseResultsAggregate, ResultsStore, parse_result
+
+
+def record(status, timestamp, duration=None, run_id=None):
+    return parse_result({'test_case_id': 'tc', 'status': status, 'timestamp': timestamp,
+                         'duration': duration, 'run_id': run_id})
+
+
+def test_window_keeps_latest_runs_by_time(monkeypatch):
+    monkeypatch.setattr(results, 'AGGREGATE_WINDOW', 3)
+    aggregate = CaseResultsAggregate()
+    for day, status, duration in [(5, 'passed', 5), (1, 'failed', 100), (4, 'failed', 4),
+                                  (2, 'passed', 200), (3, 'passed', 3)]:
+        aggregate.add(record(status, f'2024-01-0{day}T00:00:00', duration))
+
+    # В окне прогоны 3, 4, 5: passed, failed, passed
+    assert aggregate.flakiness == 1.0
+    assert aggregate.duration_percentile(100) == 5
+    assert aggregate.duration_percentile(50) == 4
+    assert aggregate.last_status == 'passed'
+    assert aggregate.pass_rate == 3 / 5
+
+
+def test_aggregates_do_not_depend_on_arrival_order(monkeypatch):
+    monkeypatch.setattr(results, 'AGGREGATE_WINDOW', 10)
+    rng = random.Random(42)
+    records = [
+        record(rng.choice(['passed', 'failed', 'skipped']), f'2024-01-{rng.randint(1, 28):02}T00:00:00',
+               rng.choice([None, rng.random()]), rng.choice([None, 'a', 'b']))
+        for _ in range(80)
+    ]
+    expected = CaseResultsAggregate()
+    for item in records:
+        expected.add(item)
+
+    for _ in range(5):
+        rng.shuffle(records)
+        aggregate = CaseResultsAggregate()
+        for item in records:
+            aggregate.add(item)
+        assert aggregate.to_dict() == expected.to_dict()
+
+
+def test_rebuild_from_partitions_matches_live_aggregates(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    store.ingest([record('passed', '2024-01-02T00:00:00')])
+    store.ingest([record('failed', '2024-01-01T00:00:00'), record('passed', '2024-01-01T01:00:00')])
+    live = store.get_aggregate('tc')
+
+    rebuilt = ResultsStore(str(tmp_path)).get_aggregate('tc')
+
+    assert rebuilt == live
+    assert live['flakiness'] == 0.5
+
+
+def test_last_status_compares_offsets_in_utc():
+    aggregate = CaseResultsAggregate()
+    aggregate.add(record('failed', '2024-01-01T06:00:00+00:00'))
+    aggregate.add(record('passed', '2024-01-01T10:00:00+05:00'))
+
+    assert aggregate.last_status == 'failed'
+
+
+def test_timestamps_are_compared_and_partitioned_in_utc(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    store.ingest([record('failed', '2024-01-01T06:00:00+00:00'),
+                  record('passed', '2024-01-01T10:00:00+05:00'),
+                  record('skipped', '2024-01-02T01:00:00+05:00')])
+
+    aggregate = store.get_aggregate('tc')
+    assert aggregate['last_status'] == 'skipped'
+    assert aggregate['last_run_at'] == '2024-01-01T20:00:00.000000+00:00'
+
+    store.ingest([record('failed', '2024-01-01T21:00:00'), record('passed', '2024-01-02T01:00:00+05:00')])
+    assert store.get_aggregate('tc')['last_status'] == 'failed'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['2024-01-01.ndjson']
+
+
+@pytest.mark.parametrize('duration', [float('nan'), float('inf'), -1, True, '1'])
+def test_parse_result_rejects_bad_durations(duration):
+    with pytest.raises(ValueError):
+        parse_result({'test_case_id': 'tc', 'status': 'passed', 'duration': duration})
+
+
+def test_api_ingest_and_detail(client):
+    body = '\n'.join([
+        json.dumps({'test_case_id': 'tc_001', 'status': 'passed', 'duration': 1.5,
+                    'timestamp': '2025-10-12T10:00:00Z', 'run_id': 'p1'}),
+        '{"test_case_id": "tc_001", "status": "failed", "duration": NaN}',
+        'not json',
+        json.dumps({'test_case_id': 'tc_001', 'status': 'failed', 'timestamp': '2025-10-12T11:00:00Z'}),
+    ])
+
+    response = client.post('/api/results', data=body, content_type='application/x-ndjson')
+
+    assert response.json['accepted'] == 2
+    assert [error['line'] for error in response.json['errors']] == [2, 3]
+    detail = client.get('/api/test-case/tc_001').json['results']
+    assert detail['last_status'] == 'failed'
+    assert detail['pass_rate'] == 0.5
+    assert detail['duration_percentiles']['p50'] == 1.5
+
+
+def test_api_listing_filters_by_aggregates(client):
+    client.post('/api/results', data='\n'.join(
+        json.dumps({'test_case_id': test_case_id, 'status': status})
+        for test_case_id, status in [('tc_001', 'passed'), ('tc_002', 'failed')]
+    ))
+
+    items = client.get('/api/test-cases?last_status=failed').json['test_cases']
+
+    assert [item['test_case']['id'] for item in items] == ['tc_002']
+    assert items[0]['results']['pass_rate'] == 0.0
+
+
+@pytest.mark.parametrize('query', ['min_pass_rate=nan', 'max_pass_rate=inf', 'min_flakiness=1.5',
+                                   'min_pass_rate=-0.1', 'last_status=green'])
+def test_api_rejects_bad_result_filters(client, query):
+    assert client.get(f'/api/test-cases?{query}').status_code == 400
+
+
+def test_api_reports_out_of_range_timestamp_as_line_error(client):
+    body = '\n'.join([
+        json.dumps({'test_case_id': 'tc_001', 'status': 'passed', 'timestamp': '9999-12-31T23:00:00-05:00'}),
+        json.dumps({'test_case_id': 'tc_001', 'status': 'passed'}),
+    ])
+
+    response = client.post('/api/results', data=body)
+
+    assert response.status_code == 200
+    assert response.json['accepted'] == 1
+    assert [error['line'] for error in response.json['errors']] == [1]
+
+
+def test_api_rejects_empty_batch(client):
+    assert client.post('/api/results', data='').status_code == 400